@@ -1,13 +1,19 @@
+import atexit
+import csv
+import os
 import sqlite3
-import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
-import re
+from collections import defaultdict
+import numpy as np
+
+# Maps header keys in the header file to the attribute they set
+_HEADER_SETTERS = {"Income": "income", "Savings": "savings", "SavingsGoal": "savings_goal"}
 
 class FinancialRecord:
     """
     Base class for managing financial records.
     """
+    __slots__ = ('income', 'savings', 'savings_goal')
+
     def __init__(self):
         """Initialize with default financial data."""
         self.income = 0
@@ -41,60 +47,225 @@ class FinanceData(FinancialRecord):
     Derived class for managing personal finance data, including expenses.
     Inherits from FinancialRecord.
     """
-    def __init__(self):
-        """Initialize with an empty expenses dictionary and database details."""
+    __slots__ = ('categories', 'descriptions', '_amounts_buf', '_amounts_len', '_expenses_view',
+                 'database', 'header_file', 'expenses_log', 'original_savings', 'deficit', 'total_expenses',
+                 'conn', '_in_batch', '_category_ids', '_log_handle', '_log_writer')
+
+    # pandas and the plotting modules, imported on first use
+    _pd = None
+    _sns = None
+    _plt = None
+
+    def __init__(self, fast_mode=False):
+        """
+        Initialize with empty expense arrays and database details.
+        :param fast_mode: Skip fsyncs and keep the journal in memory, trading crash safety for speed
+                          (intended for tests and throwaway databases).
+        """
         super().__init__()
-        self.expenses = {}
+        # Expenses are stored as parallel arrays: one entry per expense in each
+        self.categories = []
+        self.descriptions = []
+        self._amounts_buf = np.empty(16, dtype=np.float64)  # Grows by doubling; see amounts
+        self._amounts_len = 0
+        self._expenses_view = None  # Cached category -> [(description, amount)] mapping
         self.database = "finance_data.db"
-        self.text_file = "finance_data.txt"
+        self.header_file = "finance_header.txt"
+        self.expenses_log = "finance_expenses.log"
         self.original_savings = 0
         self.deficit = 0
+        self.total_expenses = 0.0  # Running total of all expense amounts
         self.conn = sqlite3.connect(self.database)  # Database connection
+        if fast_mode:
+            self.conn.execute("PRAGMA synchronous=OFF")
+            self.conn.execute("PRAGMA journal_mode=MEMORY")
+            self.conn.execute("PRAGMA temp_store=MEMORY")
+        else:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._in_batch = False
+        self._category_ids = {}  # Cache of category name -> categories.id
+        self._convert_legacy_text_file()
+        self._log_handle = open(self.expenses_log, 'a', buffering=65536, newline='')  # Append-only expenses log
+        self._log_writer = csv.writer(self._log_handle, lineterminator='\n')
         self.create_database()
         self.read_data_from_file()
 
+    def __del__(self):
+        """Close the expenses log when the instance is garbage collected."""
+        self.close()
+
+    def close(self):
+        """
+        Flush pending expense lines, close the expenses log and the database connection.
+        Safe to call on an instance whose __init__ failed part way through.
+        """
+        log_handle = getattr(self, '_log_handle', None)
+        if log_handle is not None and not log_handle.closed:
+            log_handle.close()
+        conn = getattr(self, 'conn', None)
+        if conn is not None:
+            conn.close()
+
+    def _convert_legacy_text_file(self, legacy_file="finance_data.txt"):
+        """
+        Split the legacy single data file into the header file and expenses log.
+        Only runs when the header file does not exist yet; the legacy file is left in place.
+        :param legacy_file: Path of the legacy data file.
+        """
+        if os.path.exists(self.header_file) or not os.path.exists(legacy_file):
+            return
+        header_lines = []
+        expense_lines = []
+        in_expenses_section = False
+        with open(legacy_file, 'r') as file:
+            for line in file:
+                if line.startswith("Expenses:"):
+                    in_expenses_section = True
+                elif in_expenses_section:
+                    if line.strip():
+                        expense_lines.append(line.strip() + "\n")
+                elif line.strip():
+                    header_lines.append(line.strip() + "\n")
+        # Never append the legacy expenses on top of an existing log
+        if not os.path.exists(self.expenses_log) or os.path.getsize(self.expenses_log) == 0:
+            with open(self.expenses_log, 'w') as file:
+                file.writelines(expense_lines)
+        with open(self.header_file, 'w') as file:
+            file.writelines(header_lines)
+        print(f"Converted {legacy_file} to {self.header_file} and {self.expenses_log}.")
+
     def create_database(self):
         """
-        Create a SQLite database to store expenses.
+        Create a SQLite database to store expenses and their categories.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("PRAGMA table_info(expenses)")
+        columns = {row[1] for row in cursor.fetchall()}
+        if columns and "category_id" not in columns:
+            self._migrate_legacy_expenses()
+        cursor.execute('''CREATE TABLE IF NOT EXISTS categories
+                          (id INTEGER PRIMARY KEY, name TEXT UNIQUE)''')
+        cursor.execute('''CREATE TABLE IF NOT EXISTS expenses
+                          (id INTEGER PRIMARY KEY, category_id INTEGER REFERENCES categories(id),
+                           description TEXT, amount REAL)''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_expense_key ON expenses(category_id, description, amount)")
+
+    def _migrate_legacy_expenses(self):
+        """
+        Convert a legacy expenses table with a TEXT category per row to the category_id schema,
+        keeping its rows. Runs in a single transaction.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("BEGIN")
+        try:
+            cursor.execute('''CREATE TABLE IF NOT EXISTS categories
+                              (id INTEGER PRIMARY KEY, name TEXT UNIQUE)''')
+            cursor.execute('''INSERT OR IGNORE INTO categories (name)
+                              SELECT DISTINCT category FROM expenses WHERE category IS NOT NULL''')
+            cursor.execute('''CREATE TABLE expenses_migrated
+                              (id INTEGER PRIMARY KEY, category_id INTEGER REFERENCES categories(id),
+                               description TEXT, amount REAL)''')
+            cursor.execute('''INSERT INTO expenses_migrated (id, category_id, description, amount)
+                              SELECT e.id, c.id, e.description, e.amount
+                              FROM expenses e LEFT JOIN categories c ON c.name = e.category''')
+            cursor.execute("DROP TABLE expenses")
+            cursor.execute("ALTER TABLE expenses_migrated RENAME TO expenses")
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+        self.conn.commit()
+
+    def _get_or_create_category_id(self, name):
+        """
+        Look up the id of a category, inserting it into the categories table if it is new.
+        :param name: Name of the category.
+        :return: The category's id.
         """
-        with sqlite3.connect(self.database) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''CREATE TABLE IF NOT EXISTS expenses
-                              (id INTEGER PRIMARY KEY, category TEXT, description TEXT, amount REAL)''')
+        category_id = self._category_ids.get(name)
+        if category_id is None:
+            self.conn.execute("INSERT OR IGNORE INTO categories (name) VALUES (?)", (name,))
+            category_id = self.conn.execute("SELECT id FROM categories WHERE name=?", (name,)).fetchone()[0]
+            self._category_ids[name] = category_id
+        return category_id
 
     def read_data_from_file(self):
         """
-        Read financial data from a text file and load it into the database and the class attributes.
+        Read financial data from the header file and load expenses into the class attributes.
+        The database is the source of truth for expenses; the expenses log is only imported
+        into it when the expenses table is empty.
         """
-        with sqlite3.connect(self.database) as conn:
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM expenses")  # Clear existing database records
-            try:
-                with open(self.text_file, 'r') as file:
-                    content = file.readlines()
-                    in_expenses_section = False
-                    for line in content:
-                        # Parse and set income, savings, and savings goal
-                        if line.startswith("Income:"):
-                            self.income = float(line.split(":")[1].strip())
-                        elif line.startswith("Savings:"):
-                            self.savings = float(line.split(":")[1].strip())
-                        elif line.startswith("SavingsGoal:"):
-                            self.savings_goal = float(line.split(":")[1].strip())
-                        elif line.startswith("Expenses:"):
-                            in_expenses_section = True
-                        elif in_expenses_section and line.strip():
-                            # Parse and add expenses
-                            category, description, amount = line.strip().split(", ")
-                            cursor.execute("INSERT INTO expenses (category, description, amount) VALUES (?, ?, ?)",
-                                           (category, description, float(amount)))
-                            if category not in self.expenses:
-                                self.expenses[category] = []
-                            self.expenses[category].append((description, float(amount)))
-                conn.commit()
-                self.original_savings = self.savings
-            except FileNotFoundError:
-                print("No previous data found. Starting fresh.")
+        cursor = self.conn.cursor()
+        try:
+            with open(self.header_file, 'r', buffering=131072) as file:
+                header = file.read()
+            # Parse and set income, savings, and savings goal
+            for line in header.splitlines():
+                key, _, value = line.partition(":")
+                attr = _HEADER_SETTERS.get(key)
+                if attr:
+                    setattr(self, attr, float(value.strip()))
+            self.original_savings = self.savings
+        except FileNotFoundError:
+            print("No previous data found. Starting fresh.")
+        cursor.execute("SELECT COUNT(*) FROM expenses")
+        if cursor.fetchone()[0] == 0:
+            # Parse and add expenses; fields may be quoted if they contain commas
+            with open(self.expenses_log, 'r', buffering=131072, newline='') as file:
+                rows = [(row[0], row[1], float(row[2]))
+                        for row in csv.reader(file, skipinitialspace=True) if len(row) == 3]
+            # Insert all parsed expenses with a single prepared statement
+            cursor.executemany("INSERT INTO expenses (category_id, description, amount) VALUES (?, ?, ?)",
+                               [(self._get_or_create_category_id(category), description, amount)
+                                for category, description, amount in rows])
+            self.conn.commit()
+        else:
+            cursor.execute('''SELECT c.name, e.description, e.amount
+                              FROM expenses e JOIN categories c ON c.id = e.category_id
+                              ORDER BY e.id''')
+            rows = cursor.fetchall()
+        self.categories = [category for category, _, _ in rows]
+        self.descriptions = [description for _, description, _ in rows]
+        self._amounts_buf = np.empty(max(16, len(rows)), dtype=np.float64)
+        self._amounts_buf[:len(rows)] = [amount for _, _, amount in rows]
+        self._amounts_len = len(rows)
+        self._expenses_view = None
+        self.total_expenses = float(self.amounts.sum())
+
+    @property
+    def amounts(self):
+        """
+        Amounts of all expenses, in the order they were added.
+        :return: A view of the filled part of the amounts buffer.
+        """
+        return self._amounts_buf[:self._amounts_len]
+
+    def _reserve_amounts(self, count):
+        """
+        Make room for count more amounts, doubling the buffer as often as needed.
+        :param count: Number of amounts about to be appended.
+        """
+        needed = self._amounts_len + count
+        if needed > self._amounts_buf.size:
+            capacity = self._amounts_buf.size * 2
+            while capacity < needed:
+                capacity *= 2
+            grown = np.empty(capacity, dtype=np.float64)
+            grown[:self._amounts_len] = self.amounts
+            self._amounts_buf = grown
+
+    @property
+    def expenses(self):
+        """
+        Expenses grouped by category, built lazily from the parallel arrays.
+        :return: Dictionary mapping each category to a list of (description, amount) tuples.
+        """
+        if self._expenses_view is None:
+            view = defaultdict(list)
+            for category, description, amount in zip(self.categories, self.descriptions, self.amounts.tolist()):
+                view[category].append((description, amount))
+            self._expenses_view = dict(view)
+        return self._expenses_view
 
     def add_expense(self, category, description, amount, save_to_db=True):
         """
@@ -102,17 +273,74 @@ class FinanceData(FinancialRecord):
         :param category: Category of the expense.
         :param description: Description of the expense.
         :param amount: Amount of the expense.
-        :param save_to_db: Flag to indicate if the expense should be saved to the database.
+        :param save_to_db: Flag to indicate if the expense should be persisted. When False the expense is
+                           only kept in memory for this session: it is written to neither the database
+                           nor the expenses log, so it is gone on the next start.
         """
         if amount > 0:
-            if category not in self.expenses:
-                self.expenses[category] = []
-            self.expenses[category].append((description, amount))
+            self.categories.append(category)
+            self.descriptions.append(description)
+            self._reserve_amounts(1)
+            self._amounts_buf[self._amounts_len] = amount
+            self._amounts_len += 1
+            self._expenses_view = None
+            self.total_expenses += amount
             if save_to_db:
                 self.save_expense_to_db(category, description, amount)
+                self._log_writer.writerow((category, description, amount))
             self.adjust_savings_if_needed()
             self.save_data_to_file()
 
+    def bulk_add_expenses(self, df):
+        """
+        Add many expenses at once, saving them to the database in a single transaction.
+        If called inside begin_batch/commit_batch, the rows join the caller's transaction.
+        On a database error only this call's inserts are rolled back and the error is re-raised.
+        :param df: DataFrame with category, description, and amount columns.
+        :return: Number of expenses added.
+        """
+        df = df[df['amount'] > 0]
+        categories = df['category'].astype(str).tolist()
+        descriptions = df['description'].astype(str).tolist()
+        amounts = df['amount'].to_numpy(dtype=np.float64)
+        if not categories:
+            return 0
+        owns_batch = not self._in_batch
+        if owns_batch:
+            self.begin_batch()
+        else:
+            # Inside the caller's batch: a savepoint lets a failure undo only these rows
+            self.conn.execute("SAVEPOINT bulk_add_expenses")
+        try:
+            self.conn.executemany("INSERT INTO expenses (category_id, description, amount) VALUES (?, ?, ?)",
+                                  [(self._get_or_create_category_id(category), description, amount)
+                                   for category, description, amount
+                                   in zip(categories, descriptions, amounts.tolist())])
+        except sqlite3.Error:
+            if owns_batch:
+                self.conn.rollback()
+                self._in_batch = False
+            else:
+                self.conn.execute("ROLLBACK TO bulk_add_expenses")
+                self.conn.execute("RELEASE bulk_add_expenses")
+            self._category_ids.clear()  # Categories inserted by this call were rolled back too
+            raise
+        if owns_batch:
+            self.commit_batch()
+        else:
+            self.conn.execute("RELEASE bulk_add_expenses")
+        self.categories.extend(categories)
+        self.descriptions.extend(descriptions)
+        self._reserve_amounts(len(amounts))
+        self._amounts_buf[self._amounts_len:self._amounts_len + len(amounts)] = amounts
+        self._amounts_len += len(amounts)
+        self._expenses_view = None
+        self.total_expenses += float(amounts.sum())
+        self._log_writer.writerows(zip(categories, descriptions, amounts.tolist()))
+        self.adjust_savings_if_needed()
+        self.save_data_to_file()
+        return len(categories)
+
     def save_expense_to_db(self, category, description, amount):
         """
         Save an expense to the SQLite database.
@@ -120,31 +348,40 @@ class FinanceData(FinancialRecord):
         :param description: Description of the expense.
         :param amount: Amount of the expense.
         """
-        with sqlite3.connect(self.database) as conn:
-            cursor = conn.cursor()
-            cursor.execute("INSERT INTO expenses (category, description, amount) VALUES (?, ?, ?)",
-                           (category, description, amount))
-            conn.commit()
+        self.conn.execute("INSERT INTO expenses (category_id, description, amount) VALUES (?, ?, ?)",
+                          (self._get_or_create_category_id(category), description, amount))
+        if not self._in_batch:
+            self.conn.commit()
+
+    def begin_batch(self):
+        """
+        Start a transaction so that subsequent expenses are committed together by commit_batch.
+        """
+        self.conn.execute("BEGIN")
+        self._in_batch = True
+
+    def commit_batch(self):
+        """
+        Commit all expenses saved since begin_batch in a single transaction.
+        """
+        self.conn.commit()
+        self._in_batch = False
 
     def save_data_to_file(self):
         """
-        Save financial data to a text file.
+        Save income, savings, and savings goal to the header file.
+        Expenses are appended to the expenses log as they are added.
         """
-        with open(self.text_file, 'w') as file:
+        with open(self.header_file, 'w') as file:
             file.write(f"Income: {self.income}\n")
             file.write(f"Savings: {self.savings}\n")
             file.write(f"SavingsGoal: {self.savings_goal}\n")
-            file.write("Expenses:\n")
-            for category, items in self.expenses.items():
-                for desc, amount in items:
-                    file.write(f"{category}, {desc}, {amount}\n")
 
     def adjust_savings_if_needed(self):
         """
         Adjust savings if expenses exceed income.
         """
-        total_expenses = sum(amount for items in self.expenses.values() for _, amount in items)
-        budget = self.income - total_expenses
+        budget = self.income - self.total_expenses
         if budget < 0:
             self.deficit = -budget
             self.savings -= self.deficit
@@ -161,38 +398,62 @@ class FinanceData(FinancialRecord):
         print(f"Original Savings: ${self.original_savings:.2f}")
         print(f"Current Savings: ${self.savings:.2f}")
         print("Expenses:")
-        for category, items in self.expenses.items():
-            for desc, amount in items:
-                print(f"{category}: {desc} - ${amount:.2f}")
-        total_expenses = sum(amount for items in self.expenses.values() for _, amount in items)
-        print(f"Total Expenses: ${total_expenses:.2f}")
+        for category, desc, amount in zip(self.categories, self.descriptions, self.amounts):
+            print(f"{category}: {desc} - ${amount:.2f}")
+        print(f"Total Expenses: ${self.total_expenses:.2f}")
         print(f"Deficit: ${self.deficit:.2f}")
-        remaining_budget = max(self.income - total_expenses, 0)
+        remaining_budget = max(self.income - self.total_expenses, 0)
         print(f"Remaining Budget: ${remaining_budget:.2f}")
         print(f"Savings Goal: ${self.savings_goal:.2f}\n")
 
+    @staticmethod
+    def load_pandas():
+        """
+        Import pandas on first use and cache it on the class.
+        :return: The pandas module.
+        """
+        if FinanceData._pd is None:
+            import pandas as pd
+            FinanceData._pd = pd
+        return FinanceData._pd
+
     def visualize_expenses(self):
         """
         Visualize expenses in a bar plot and a pie chart.
         """
+        pd = FinanceData.load_pandas()
+        if FinanceData._plt is None:
+            import seaborn as sns
+            import matplotlib.pyplot as plt
+            FinanceData._sns, FinanceData._plt = sns, plt
+        sns, plt = FinanceData._sns, FinanceData._plt
         sns.set_theme(style="whitegrid")
         plt.figure(figsize=(10, 6))
-        for category, items in self.expenses.items():
-            sns.barplot(x=[amount for _, amount in items], y=[f"{category}: {desc}" for desc, _ in items])
+        df = pd.DataFrame({
+            'category': self.categories,
+            'label': [f"{category}: {desc}" for category, desc in zip(self.categories, self.descriptions)],
+            'amount': self.amounts
+        })
+        sns.barplot(data=df, x='amount', y='label', hue='category', orient='h', dodge=False)
         plt.title('Expense Breakdown')
         plt.xlabel('Amount ($)')
         plt.ylabel('Description')
         plt.show()
 
-        remaining_budget = max(self.income - sum(amount for items in self.expenses.values() for _, amount in items), 0)
+        remaining_budget = max(self.income - self.total_expenses, 0)
         data = {
             'Remaining Income': remaining_budget,
             'Savings': self.savings,
             'Deficit': self.deficit
         }
-        labels, sizes = zip(*[(k, v) for k, v in data.items() if v > 0])
+        labels = np.array(list(data.keys()))
+        sizes = np.array(list(data.values()), dtype=np.float64)
+        mask = sizes > 0
+        labels, sizes = labels[mask], sizes[mask]
+        total = float(np.sum(sizes))
         plt.figure(figsize=(6, 6))
-        plt.pie(sizes, labels=labels, autopct=lambda pct: f'{pct:.1f}% (${pct/100*sum(sizes):.2f})', startangle=140)
+        plt.pie(sizes, labels=labels, autopct=lambda pct, total=total: f'{pct:.1f}% (${pct/100*total:.2f})',
+                startangle=140)
         plt.axis('equal')
         plt.title('Financial Overview')
         plt.show()
@@ -202,21 +463,23 @@ class FinanceData(FinancialRecord):
         Print the contents of the expenses table from the SQLite database.
         """
         print("\nDatabase Contents:")
-        with sqlite3.connect(self.database) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM expenses")
-            rows = cursor.fetchall()
-            if rows:
-                for row in rows:
-                    print(f"ID: {row[0]}, Category: {row[1]}, Description: {row[2]}, Amount: ${row[3]}")
-            else:
-                print("No expenses recorded in the database.")
+        cursor = self.conn.cursor()
+        cursor.execute('''SELECT e.id, c.name, e.description, e.amount
+                          FROM expenses e JOIN categories c ON c.id = e.category_id
+                          ORDER BY e.id''')
+        rows = cursor.fetchall()
+        if rows:
+            for row in rows:
+                print(f"ID: {row[0]}, Category: {row[1]}, Description: {row[2]}, Amount: ${row[3]}")
+        else:
+            print("No expenses recorded in the database.")
 
 def main():
     """
     Main function to run the Personal Finance Assistant application.
     """
     finance_data = FinanceData()
+    atexit.register(finance_data.close)
 
     while True:
         print("\nPersonal Finance Assistant")
@@ -226,7 +489,8 @@ def main():
         print("4. Display Financial Summary")
         print("5. Visualize Expenses")
         print("6. Print Database Contents")
-        print("7. Exit")
+        print("7. Bulk Import CSV")
+        print("8. Exit")
         choice = input("Enter your choice: ")
 
         if choice == '1':
@@ -265,6 +529,22 @@ def main():
             finance_data.print_database_contents()
 
         elif choice == '7':
+            pd = FinanceData.load_pandas()
+            path = input("Enter the CSV file path (columns: category, description, amount): ")
+            try:
+                df = pd.read_csv(path, dtype={'amount': np.float64}, skipinitialspace=True)
+                count = finance_data.bulk_add_expenses(df)
+                print(f"{count} expenses imported successfully.")
+            except FileNotFoundError:
+                print("File not found. Please check the path.")
+            except OSError as e:
+                print(f"Could not read the file: {e}")
+            except (KeyError, ValueError):
+                print("Invalid CSV. Expected category, description, and amount columns with numeric amounts.")
+            except sqlite3.Error as e:
+                print(f"Database error, no expenses were imported: {e}")
+
+        elif choice == '8':
             print("Goodbye!")
             break
 
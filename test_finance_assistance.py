@@ -1,30 +1,183 @@
 import os
+import shutil
+import sqlite3
+import pandas as pd
+import pytest
 from finance_assistant import FinanceData
 
+SAMPLE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+@pytest.fixture(autouse=True)
+def data_dir(tmp_path, monkeypatch):
+    # Run each test against copies of the sample data so fast mode only touches a throwaway database
+    for name in ("finance_header.txt", "finance_expenses.log"):
+        shutil.copy(os.path.join(SAMPLE_DIR, name), tmp_path / name)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
 def test_add_income():
-    finance_data = FinanceData()
+    finance_data = FinanceData(fast_mode=True)
     finance_data.add_income(4500)
     assert finance_data.income == 9000
 
 def test_set_savings_goal():
-    finance_data = FinanceData()
+    finance_data = FinanceData(fast_mode=True)
     finance_data.set_savings_goal(6000)
     assert finance_data.savings_goal == 6000
 
 def test_adjust_savings():
-    finance_data = FinanceData()
+    finance_data = FinanceData(fast_mode=True)
     finance_data.add_income(500)
     finance_data.add_expense("Rent", "Monthly Rent", 1000)
     finance_data.adjust_savings_if_needed()
     assert finance_data.savings == 1500
 
 def test_add_expense():
-    finance_data = FinanceData()
+    finance_data = FinanceData(fast_mode=True)
     finance_data.add_expense("Groceries", "Bread", 2.25)
     assert finance_data.expenses["Groceries"][1] == ("Bread", 2.25)
 
+def test_expense_description_with_comma():
+    finance_data = FinanceData(fast_mode=True)
+    finance_data.add_expense("Dining", "Lunch, with team", 18.40)
+    finance_data.close()
+    finance_data = FinanceData(fast_mode=True)
+    assert ("Lunch, with team", 18.40) in finance_data.expenses["Dining"]
+
+def test_import_log_with_quoted_comma(data_dir):
+    # No database exists yet in the test directory, so the log is imported
+    with open(data_dir / "finance_expenses.log", "a") as file:
+        file.write('Dining,"Lunch, with team",18.4\n')
+    finance_data = FinanceData(fast_mode=True)
+    assert ("Lunch, with team", 18.40) in finance_data.expenses["Dining"]
+    cursor = finance_data.conn.cursor()
+    cursor.execute('''SELECT c.name, e.amount FROM expenses e JOIN categories c ON c.id = e.category_id
+                      WHERE e.description = ?''', ("Lunch, with team",))
+    assert cursor.fetchall() == [("Dining", 18.40)]
+
+def test_unsaved_expense_not_persisted():
+    finance_data = FinanceData(fast_mode=True)
+    finance_data.add_expense("Cash", "Coffee", 4.00, save_to_db=False)
+    assert ("Coffee", 4.00) in finance_data.expenses["Cash"]
+    finance_data.close()
+    finance_data = FinanceData(fast_mode=True)
+    assert "Cash" not in finance_data.expenses
+    with open("finance_expenses.log") as file:
+        assert "Coffee" not in file.read()
+
+def test_total_expenses():
+    finance_data = FinanceData(fast_mode=True)
+    expected_total = sum(amount for items in finance_data.expenses.values() for _, amount in items)
+    assert finance_data.total_expenses == pytest.approx(expected_total)
+    finance_data.add_expense("Groceries", "Butter", 3.75)
+    assert finance_data.total_expenses == pytest.approx(expected_total + 3.75)
+
+def test_batch_add_expenses():
+    finance_data = FinanceData(fast_mode=True)
+    finance_data.begin_batch()
+    finance_data.add_expense("Travel", "Train Ticket", 25.00)
+    finance_data.add_expense("Travel", "Hotel", 120.00)
+    assert finance_data.conn.in_transaction
+    finance_data.commit_batch()
+    assert not finance_data.conn.in_transaction
+    cursor = finance_data.conn.cursor()
+    cursor.execute('''SELECT COUNT(*) FROM expenses e JOIN categories c ON c.id = e.category_id
+                      WHERE c.name=? AND e.description IN (?, ?)''', ("Travel", "Train Ticket", "Hotel"))
+    assert cursor.fetchone()[0] == 2
+
+def test_bulk_add_expenses():
+    finance_data = FinanceData(fast_mode=True)
+    total_before = finance_data.total_expenses
+    df = pd.DataFrame({
+        "category": ["Pets", "Pets", "Pets"],
+        "description": ["Dog Food", "Vet Visit", "Refund"],
+        "amount": [30.00, 75.00, 0.00],
+    })
+    assert finance_data.bulk_add_expenses(df) == 2
+    assert finance_data.expenses["Pets"][-2:] == [("Dog Food", 30.00), ("Vet Visit", 75.00)]
+    assert finance_data.total_expenses == pytest.approx(total_before + 105.00)
+    assert len(finance_data.amounts) == len(finance_data.categories)
+
+def test_bulk_add_expenses_inside_batch():
+    finance_data = FinanceData(fast_mode=True)
+    df = pd.DataFrame({"category": ["Pets"], "description": ["Leash"], "amount": [12.00]})
+    finance_data.begin_batch()
+    assert finance_data.bulk_add_expenses(df) == 1
+    assert finance_data.conn.in_transaction
+    finance_data.commit_batch()
+    assert ("Leash", 12.00) in finance_data.expenses["Pets"]
+
+def test_bulk_add_expenses_rolls_back_on_error():
+    finance_data = FinanceData(fast_mode=True)
+    finance_data.conn.execute('''CREATE TRIGGER reject_boom BEFORE INSERT ON expenses
+                                 WHEN NEW.description = 'Boom'
+                                 BEGIN SELECT RAISE(ABORT, 'rejected'); END''')
+    count_before = len(finance_data.categories)
+    df = pd.DataFrame({"category": ["Hobbies", "Hobbies"], "description": ["Paint", "Boom"], "amount": [8.00, 9.00]})
+    with pytest.raises(sqlite3.Error):
+        finance_data.bulk_add_expenses(df)
+    assert not finance_data.conn.in_transaction
+    assert len(finance_data.categories) == count_before
+    # Later single inserts must still be committed and joined to a valid category
+    finance_data.add_expense("Hobbies", "Brushes", 6.00)
+    assert not finance_data.conn.in_transaction
+    cursor = finance_data.conn.cursor()
+    cursor.execute('''SELECT c.name, e.description FROM expenses e JOIN categories c ON c.id = e.category_id
+                      WHERE e.description IN ('Paint', 'Brushes')''')
+    assert cursor.fetchall() == [("Hobbies", "Brushes")]
+
+def test_bulk_add_expenses_error_keeps_caller_batch():
+    finance_data = FinanceData(fast_mode=True)
+    finance_data.conn.execute('''CREATE TRIGGER reject_boom BEFORE INSERT ON expenses
+                                 WHEN NEW.description = 'Boom'
+                                 BEGIN SELECT RAISE(ABORT, 'rejected'); END''')
+    finance_data.begin_batch()
+    finance_data.add_expense("Travel", "Hotel", 100.00)
+    df = pd.DataFrame({"category": ["Hobbies", "Hobbies"], "description": ["Paint", "Boom"], "amount": [8.00, 9.00]})
+    with pytest.raises(sqlite3.Error):
+        finance_data.bulk_add_expenses(df)
+    # Only the failed bulk insert is undone; the caller's batch stays open with its earlier rows
+    assert finance_data.conn.in_transaction
+    finance_data.commit_batch()
+    cursor = finance_data.conn.cursor()
+    cursor.execute('''SELECT c.name, e.description FROM expenses e JOIN categories c ON c.id = e.category_id
+                      WHERE e.description IN ('Hotel', 'Paint')''')
+    assert cursor.fetchall() == [("Travel", "Hotel")]
+
+def test_legacy_text_file_converted(data_dir):
+    os.remove(data_dir / "finance_header.txt")
+    os.remove(data_dir / "finance_expenses.log")
+    with open(data_dir / "finance_data.txt", "w") as file:
+        file.write("Income: 3200\nSavings: 800\nSavingsGoal: 5000\nExpenses:\n"
+                   "Groceries, Milk, 3.50\nTransport, Bus Pass, 20.00")
+    finance_data = FinanceData(fast_mode=True)
+    assert (finance_data.income, finance_data.savings, finance_data.savings_goal) == (3200, 800, 5000)
+    assert finance_data.expenses == {"Groceries": [("Milk", 3.50)], "Transport": [("Bus Pass", 20.00)]}
+    finance_data.close()
+    # The converted files are used from now on
+    finance_data = FinanceData(fast_mode=True)
+    assert finance_data.income == 3200
+    with open(data_dir / "finance_expenses.log") as file:
+        assert file.read() == "Groceries, Milk, 3.50\nTransport, Bus Pass, 20.00\n"
+
+def test_legacy_database_migrated():
+    conn = sqlite3.connect("finance_data.db")
+    conn.execute("CREATE TABLE expenses (id INTEGER PRIMARY KEY, category TEXT, description TEXT, amount REAL)")
+    conn.executemany("INSERT INTO expenses (category, description, amount) VALUES (?, ?, ?)",
+                     [("Groceries", "Milk", 3.50), ("Rent", "Deposit", 900.00), ("Groceries", "Rice", 6.25)])
+    conn.commit()
+    conn.close()
+    finance_data = FinanceData(fast_mode=True)
+    # The rows come from the migrated database, not from the expenses log
+    assert finance_data.expenses == {"Groceries": [("Milk", 3.50), ("Rice", 6.25)], "Rent": [("Deposit", 900.00)]}
+    cursor = finance_data.conn.cursor()
+    cursor.execute('''SELECT e.id, c.name, e.description, e.amount
+                      FROM expenses e JOIN categories c ON c.id = e.category_id ORDER BY e.id''')
+    assert cursor.fetchall() == [(1, "Groceries", "Milk", 3.50), (2, "Rent", "Deposit", 900.00),
+                                 (3, "Groceries", "Rice", 6.25)]
+
 def test_expenses_from_file():
-    finance_data = FinanceData()
+    finance_data = FinanceData(fast_mode=True)
     # Check if expenses from the file match the expected values
     expected_expenses = {
         "Groceries": [("Milk", 3.50), ("Bread", 2.25), ("Eggs", 4.00)],
@@ -41,7 +194,7 @@ def test_expenses_from_file():
             assert (desc, amount) in finance_data.expenses[category]
 
 def test_database_contents():
-    finance_data = FinanceData()
+    finance_data = FinanceData(fast_mode=True)
     # Check if the database contains the expected expenses
     expected_expenses = {
         "Groceries": [("Milk", 3.50), ("Bread", 2.25), ("Eggs", 4.00)],
@@ -53,24 +206,30 @@ def test_database_contents():
         "Education": [("Books", 80.00), ("Online Course", 50.00)],
         "Miscellaneous": [("Donation", 10.00), ("Gifts", 40.00)],
     }
+    # Load every stored expense once and check membership against the set
+    cursor = finance_data.conn.cursor()
+    cursor.execute('''SELECT c.name, e.description, e.amount
+                      FROM expenses e JOIN categories c ON c.id = e.category_id''')
+    stored = set(cursor.fetchall())
     for category, items in expected_expenses.items():
         for desc, amount in items:
-            # Check if the expense is in the database
-            with finance_data.conn as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT * FROM expenses WHERE category=? AND description=? AND amount=?",
-                               (category, desc, amount))
-                result = cursor.fetchone()
-                assert result is not None
-
-if __name__ == '__main__':
-    # Remove the existing database file if it exists
-    if os.path.exists("finance_data.db"):
-        os.remove("finance_data.db")
+            assert (category, desc, amount) in stored
 
-    # Run the test functions
-    test_add_income()
-    test_set_savings_goal()
-    test_expenses_from_file()
+def test_database_not_reloaded():
+    finance_data = FinanceData(fast_mode=True)
+    # Change the database behind the log's back; a re-import from the log would undo both edits
+    finance_data.conn.execute("DELETE FROM expenses WHERE id = (SELECT MAX(id) FROM expenses)")
+    finance_data.conn.execute("UPDATE expenses SET description = 'Oat Milk' WHERE description = 'Milk'")
+    finance_data.conn.commit()
+    ids_before = [row[0] for row in finance_data.conn.execute("SELECT id FROM expenses ORDER BY id")]
+    finance_data.close()
+    finance_data = FinanceData(fast_mode=True)
+    # Reopening must load expenses from the database without deleting and inserting them again
+    ids_after = [row[0] for row in finance_data.conn.execute("SELECT id FROM expenses ORDER BY id")]
+    assert ids_after == ids_before
+    assert len(finance_data.categories) == len(ids_before)
+    assert ("Oat Milk", 3.50) in finance_data.expenses["Groceries"]
 
-    print("All tests passed.")
+if __name__ == '__main__':
+    # Run through pytest so every test gets the temporary data directory fixture
+    raise SystemExit(pytest.main([__file__]))